@@ -31,6 +31,11 @@ SMART_FM_ENVIRONMENTS = ["SIT", "UAT"]
 def load_data(project_name):
     """Load data from Excel file for a specific project"""
     excel_file = os.path.join(data_folder, PROJECTS.get(project_name))
+    # jiraextraction.py run with EXPORT_FORMAT=csv writes a .csv next to the .xlsx; use it when it is the newer export
+    csv_file = os.path.splitext(excel_file)[0] + ".csv"
+    if (os.path.basename(excel_file).startswith("Jira ") and os.path.exists(csv_file) and
+            (not os.path.exists(excel_file) or os.path.getmtime(csv_file) > os.path.getmtime(excel_file))):
+        excel_file = csv_file
     
     if not os.path.exists(excel_file):
         print(f"Warning: Excel file not found at {excel_file}")
@@ -39,7 +44,7 @@ def load_data(project_name):
             print(f"Available files in data folder: {available_files}")
         return pd.DataFrame(columns=["State", "ID", "Issue Links", "Severity", "Assigned To", "Title", "Tags", "Environment"])
     
-    df = pd.read_excel(excel_file)
+    df = pd.read_csv(excel_file) if excel_file == csv_file else pd.read_excel(excel_file)
     
     # Handle different column structures (DevOps vs Jira)
     if "Original Jira State" in df.columns:
@@ -76,22 +81,20 @@ def load_data(project_name):
 
 def refresh_data_from_sources():
     """Run extraction scripts for all data sources"""
-    try:
-        print(f"🔄 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Refreshing data from all sources...")
-        
-        devops_script = os.path.join(current_dir, "defectsextraction.py")
-        if os.path.exists(devops_script):
-            print("  📥 Extracting from Azure DevOps...")
-            subprocess.run(["python", devops_script], check=True)
-        
-        jira_script = os.path.join(current_dir, "jiraextraction.py")
-        if os.path.exists(jira_script):
-            print("  📥 Extracting from Jira...")
-            subprocess.run(["python", jira_script], check=True)
-        
-        print(f"✅ [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Data refresh completed")
-    except Exception as e:
-        print(f"❌ [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error refreshing data: {str(e)}")
+    print(f"🔄 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Refreshing data from all sources...")
+    
+    # Each extractor runs on its own, so one source failing doesn't block the other
+    for source, script_name in [("Azure DevOps", "defectsextraction.py"), ("Jira", "jiraextraction.py")]:
+        script = os.path.join(current_dir, script_name)
+        if not os.path.exists(script):
+            continue
+        try:
+            print(f"  📥 Extracting from {source}...")
+            subprocess.run(["python", script], check=True)
+        except Exception as e:
+            print(f"❌ [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error refreshing {source} data: {str(e)}")
+    
+    print(f"✅ [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Data refresh completed")
 
 def schedule_data_refresh():
     """Background thread to refresh data every 5 minutes"""
@@ -1,10 +1,18 @@
 import requests
+try:
+    import orjson as _json  # faster JSON decoding when available
+except ImportError:
+    import json as _json
 from requests.auth import HTTPBasicAuth
-import openpyxl
-from openpyxl.utils import get_column_letter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import xlsxwriter
 from urllib.parse import quote
 import os
 import time
+import logging
+import sys
+import re
 
 # Replace with your values
 organization = "SobhaRealty"
@@ -13,214 +21,277 @@ pat = os.getenv("DEVOPS_PAT")   # <-- set this in your environment
 query_path = "My Queries/Smart-FM Replacement"
 query_path_encoded = quote(query_path, safe='')
 
-print("📄 Starting defects extraction...")
-start_time = time.time()
-
-# 1️⃣ Get saved query ID
-print("📋 Fetching saved query...")
-query_url = f"https://dev.azure.com/{organization}/{project}/_apis/wit/queries/{query_path_encoded}?api-version=7.0"
-query_response = requests.get(query_url, auth=HTTPBasicAuth("", pat), timeout=30)
-
-if query_response.status_code != 200:
-    print(f"❌ Error fetching query: {query_response.status_code} - {query_response.text}")
-    exit()
-
-query_id = query_response.json().get("id")
-if not query_id:
-    print("❌ Could not get query ID from response.")
-    exit()
-
-print(f"✅ Query ID retrieved: {query_id}")
-
-# 2️⃣ Run saved query to get work item IDs
-print("🔍 Running saved query to fetch work items...")
-run_query_url = f"https://dev.azure.com/{organization}/{project}/_apis/wit/wiql/{query_id}?api-version=7.0"
-wiql_response = requests.get(run_query_url, auth=HTTPBasicAuth("", pat), timeout=30)
-
-if wiql_response.status_code != 200:
-    print(f"❌ Error running saved query: {wiql_response.status_code} - {wiql_response.text}")
-    exit()
-
-work_items = wiql_response.json().get("workItems", [])
-ids = [str(item["id"]) for item in work_items]
-
-if not ids:
-    print("⚠️ No work items found.")
-    exit()
-
-print(f"✅ Found {len(ids)} work items. Fetching details...")
-
-# 3️⃣ Create Excel
-wb = openpyxl.Workbook()
-sheet = wb.active
-sheet.title = "Defects"
-sheet.append(["ID", "Work Item Type", "Title", "State", "Assigned To", "Tags", "Environment", "Severity", "Issue Links"])
-
-# 🔍 DEBUG: Track environment extraction
-print("\n" + "="*80)
-print("🔍 DEBUGGING ENVIRONMENT EXTRACTION")
-print("="*80)
-
-environment_stats = {
-    "SIT": 0,
-    "UAT": 0,
-    "Both": 0,
-    "None": 0,
-    "samples": []
-}
-
-# 4️⃣ Fetch details for each work item with progress indicator
-print("\n📥 Fetching work item details...")
-for idx, work_id in enumerate(ids, start=1):
-    if idx % 10 == 0 or idx == len(ids):
-        print(f"   Progress: {idx}/{len(ids)} work items processed...")
-    
-    wi_url = f"https://dev.azure.com/{organization}/{project}/_apis/wit/workitems/{work_id}?api-version=7.0&$expand=Relations"
-    
-    try:
-        wi_resp = requests.get(wi_url, auth=HTTPBasicAuth("", pat), timeout=30)
-        
-        if wi_resp.status_code != 200:
-            print(f"⚠️ Failed to fetch work item {work_id}: {wi_resp.status_code}")
-            continue
-
-        wi_detail = wi_resp.json()
-        fields = wi_detail.get("fields", {})
-
-        # Direct DevOps URL for the defect
-        issue_link = f"https://dev.azure.com/{organization}/{project}/_workitems/edit/{wi_detail.get('id', '')}"
-
-        # Extract Tags
-        tags = fields.get("System.Tags", "")
-        
-        # 🔍 DEBUG: Log ALL fields for first work item to find Environment field
-        if idx == 1:
-            print(f"\n{'='*80}")
-            print(f"🔍 WORK ITEM {work_id} - FINDING ENVIRONMENT FIELD")
-            print(f"{'='*80}")
-            print("   All available fields:")
-            for key in sorted(fields.keys()):
-                value = fields.get(key)
-                # Only show non-empty fields
-                if value and value != "":
-                    print(f"      {key} = '{value}'")
-            print(f"{'='*80}\n")
-        
-        # 🔍 DEBUG: Log tags for first 5 items
-        if idx <= 5:
-            print(f"\n--- Work Item {work_id} ---")
-            print(f"   Tags: '{tags}'")
-        
-        # Extract Environment - Try ALL possible field name patterns
-        environment = ""
-        
-        # Search through ALL fields for anything containing "environment"
-        for field_key, field_value in fields.items():
-            if "environment" in field_key.lower() and field_value:
-                environment = str(field_value).strip()
-                if idx <= 5:
-                    print(f"   ✅ Found Environment field: '{field_key}' = '{environment}'")
-                break
-        
-        # If no dedicated field found, try parsing from tags as fallback
-        if not environment and tags:
-            tags_lower = tags.lower()
-            tags_list = [t.strip() for t in str(tags).split(';')]
-            
-            # Look for SIT or UAT in individual tags
-            for tag in tags_list:
-                tag_upper = tag.upper()
-                if tag_upper == "SIT":
-                    environment = "SIT"
-                    break
-                elif tag_upper == "UAT":
-                    environment = "UAT"
-                    break
-            
-            if idx <= 5:
-                print(f"   Parsing from tags: {tags_list}")
-                if environment:
-                    print(f"   ✅ Environment from tags: '{environment}'")
-        
-        # Update statistics
-        if environment:
-            env_upper = environment.upper()
-            if "SIT" in env_upper and "UAT" in env_upper:
-                environment_stats["Both"] += 1
-            elif "SIT" in env_upper:
-                environment_stats["SIT"] += 1
-            elif "UAT" in env_upper:
-                environment_stats["UAT"] += 1
-            else:
-                environment_stats["None"] += 1
-        else:
-            environment_stats["None"] += 1
-        
-        if idx <= 5:
-            print(f"   Final Environment value: '{environment}'")
-        
-        # Store sample for debugging
-        if len(environment_stats["samples"]) < 10:
-            environment_stats["samples"].append({
-                "id": work_id,
-                "tags": tags,
-                "environment": environment
-            })
-
-        # Extract data
-        row_num = idx + 1
-        sheet.cell(row=row_num, column=1, value=wi_detail.get("id", ""))
-        sheet.cell(row=row_num, column=2, value=fields.get("System.WorkItemType", ""))
-        sheet.cell(row=row_num, column=3, value=fields.get("System.Title", ""))
-        sheet.cell(row=row_num, column=4, value=fields.get("System.State", ""))
-        sheet.cell(row=row_num, column=5,
-                   value=fields.get("System.AssignedTo", {}).get("displayName", "")
-                   if fields.get("System.AssignedTo") else "")
-        sheet.cell(row=row_num, column=6, value=tags)
-        sheet.cell(row=row_num, column=7, value=environment)
-        sheet.cell(row=row_num, column=8, value=fields.get("Microsoft.VSTS.Common.Severity", ""))
-        sheet.cell(row=row_num, column=9, value=issue_link)
-        
-    except requests.exceptions.Timeout:
-        print(f"⚠️ Timeout fetching work item {work_id}")
-        continue
-    except Exception as e:
-        print(f"⚠️ Error processing work item {work_id}: {str(e)}")
-        continue
-
-# 🔍 DEBUG: Print environment extraction summary
-print("\n" + "="*80)
-print("📊 ENVIRONMENT EXTRACTION SUMMARY")
-print("="*80)
-print(f"Total work items processed: {len(ids)}")
-print(f"Items with SIT only: {environment_stats['SIT']}")
-print(f"Items with UAT only: {environment_stats['UAT']}")
-print(f"Items with both SIT & UAT: {environment_stats['Both']}")
-print(f"Items with no environment: {environment_stats['None']}")
-print("\n📝 Sample entries:")
-for sample in environment_stats["samples"]:
-    print(f"   ID {sample['id']}: Tags='{sample['tags']}' → Environment='{sample['environment']}'")
-print("="*80 + "\n")
-
-# 5️⃣ Adjust column widths
-for col in range(1, 10):
-    sheet.column_dimensions[get_column_letter(col)].width = 40
-
-# 6️⃣ Save Excel
+# Output file, set up before any API calls so an unwritable data folder fails fast
 current_dir = os.path.dirname(os.path.abspath(__file__))  # folder where this script lives
 data_folder = os.path.join(current_dir, "data")           # 'data' folder inside repo
 os.makedirs(data_folder, exist_ok=True)                   # create 'data' folder if missing
-
 save_path = os.path.join(data_folder, "Smart FM Defects through Python.xlsx")
-wb.save(save_path)
+# Directory for xlsxwriter's per-sheet scratch files; defaults to the system temp dir. Set e.g.
+# XLSX_SCRATCH_DIR=/dev/shm to keep them in RAM, but only where it has room (Docker's default is 64 MB)
+scratch_dir = os.getenv("XLSX_SCRATCH_DIR") or None
+
+# One pooled session for all DevOps calls: the TLS connection is reused across the query and
+# batch requests, and transient errors (429/5xx) are retried with backoff (including the
+# workitemsbatch POST, which only reads)
+session = requests.Session()
+session.auth = HTTPBasicAuth("", pat)
+session.mount("https://", HTTPAdapter(
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=None, raise_on_status=False)
+))
+
+# Matches a whole ';'-separated tag equal to SIT or UAT (case-insensitive)
+ENV_TAG_RE = re.compile(r"(?:^|;)\s*(SIT|UAT)\s*(?=;|$)", re.IGNORECASE)
+
+# Environment diagnostics are logged at DEBUG level; run with LOG_LEVEL=DEBUG to see them
+# The handler is attached to this logger only, so importing the module leaves the root logger alone
+log = logging.getLogger(__name__)
+if not log.handlers:
+    log_handler = logging.StreamHandler(sys.stdout)
+    log_handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(log_handler)
+    log.propagate = False
+log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+# Unknown level names fall back to INFO instead of failing at import
+log.setLevel(log_level if isinstance(logging.getLevelName(log_level), int) else logging.INFO)
+debug = log.isEnabledFor(logging.DEBUG)
+
+
+def run():
+    """Extract the Smart FM saved-query defects into data/Smart FM Defects through Python.xlsx"""
+    print("📄 Starting defects extraction...")
+    start_time = time.time()
+
+    # 1️⃣ Get saved query ID
+    print("📋 Fetching saved query...")
+    query_url = f"https://dev.azure.com/{organization}/{project}/_apis/wit/queries/{query_path_encoded}?api-version=7.0"
+    query_response = session.get(query_url, timeout=30)
+
+    if query_response.status_code != 200:
+        print(f"❌ Error fetching query: {query_response.status_code} - {query_response.text}")
+        return 1
+
+    query_id = _json.loads(query_response.content).get("id")
+    if not query_id:
+        print("❌ Could not get query ID from response.")
+        return 1
+
+    print(f"✅ Query ID retrieved: {query_id}")
+
+    # 2️⃣ Run saved query to get work item IDs
+    print("🔍 Running saved query to fetch work items...")
+    run_query_url = f"https://dev.azure.com/{organization}/{project}/_apis/wit/wiql/{query_id}?api-version=7.0"
+    wiql_response = session.get(run_query_url, timeout=30)
+
+    if wiql_response.status_code != 200:
+        print(f"❌ Error running saved query: {wiql_response.status_code} - {wiql_response.text}")
+        return 1
+
+    work_items = _json.loads(wiql_response.content).get("workItems", [])
+    ids = [item["id"] for item in work_items]
+
+    if not ids:
+        print("⚠️ No work items found.")
+        return 0
+
+    print(f"✅ Found {len(ids)} work items. Fetching details...")
+
+    # 3️⃣ Excel rows, kept as tuples and written in one pass once all work items are processed
+    headers = ["ID", "Work Item Type", "Title", "State", "Assigned To", "Tags", "Environment", "Severity", "Issue Links"]
+    rows = []
+
+    # 🔍 DEBUG: Track environment extraction
+    if debug:
+        log.debug("\n" + "="*80)
+        log.debug("🔍 DEBUGGING ENVIRONMENT EXTRACTION")
+        log.debug("="*80)
+
+    environment_stats = {
+        "SIT": 0,
+        "UAT": 0,
+        "Both": 0,
+        "None": 0,
+        "samples": []
+    }
+
+    # 4️⃣ Fetch work item details in batches (the batch API accepts up to 200 IDs per call)
+    print("\n📥 Fetching work item details...")
+    batch_url = f"https://dev.azure.com/{organization}/{project}/_apis/wit/workitemsbatch?api-version=7.0"
+    batch_size = 200
+    work_item_details = []
+    omitted = 0
+    # The session already retries transient failures, so a batch that still fails aborts the run
+    # (exit 1) rather than saving an export that silently lacks up to 200 work items
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        try:
+            batch_resp = session.post(batch_url, json={"ids": batch_ids, "errorPolicy": "omit"}, timeout=30)
+
+            if batch_resp.status_code != 200:
+                print(f"❌ Failed to fetch work items {batch_ids[0]}-{batch_ids[-1]}: {batch_resp.status_code}")
+                print(f"❌ {save_path} was not updated")
+                return 1
+
+            batch_items = _json.loads(batch_resp.content).get("value", [])
+        except (requests.RequestException, ValueError) as e:
+            print(f"❌ Error fetching work items {batch_ids[0]}-{batch_ids[-1]}: {str(e)}")
+            print(f"❌ {save_path} was not updated")
+            return 1
+
+        # errorPolicy=omit returns null in place of items that could not be read
+        found = [item for item in batch_items if item]
+        omitted += len(batch_ids) - len(found)
+        work_item_details.extend(found)
+        print(f"   Progress: {min(start + batch_size, len(ids))}/{len(ids)} work items fetched...")
+
+    if omitted:
+        print(f"⚠️ {omitted} work items could not be read (deleted or no access) and were skipped")
+
+    # 5️⃣ Process each work item
+    for idx, wi_detail in enumerate(work_item_details, start=1):
+        work_id = wi_detail.get("id", "")
+        try:
+            fields = wi_detail.get("fields", {})
+
+            # Direct DevOps URL for the defect
+            issue_link = f"https://dev.azure.com/{organization}/{project}/_workitems/edit/{wi_detail.get('id', '')}"
+
+            # Extract Tags
+            tags = fields.get("System.Tags", "")
+
+            # 🔍 DEBUG: Log ALL fields for first work item to find Environment field
+            if debug and idx == 1:
+                log.debug(f"\n{'='*80}")
+                log.debug(f"🔍 WORK ITEM {work_id} - FINDING ENVIRONMENT FIELD")
+                log.debug(f"{'='*80}")
+                log.debug("   All available fields:")
+                for key in sorted(fields.keys()):
+                    value = fields.get(key)
+                    # Only show non-empty fields
+                    if value and value != "":
+                        log.debug(f"      {key} = '{value}'")
+                log.debug(f"{'='*80}\n")
+
+            # 🔍 DEBUG: Log tags for first 5 items
+            if debug and idx <= 5:
+                log.debug(f"\n--- Work Item {work_id} ---")
+                log.debug(f"   Tags: '{tags}'")
+
+            # Extract Environment - Try ALL possible field name patterns
+            environment = ""
+
+            # Search through ALL fields for anything containing "environment"
+            for field_key, field_value in fields.items():
+                if "environment" in field_key.lower() and field_value:
+                    environment = str(field_value).strip()
+                    if debug and idx <= 5:
+                        log.debug(f"   ✅ Found Environment field: '{field_key}' = '{environment}'")
+                    break
+
+            # If no dedicated field found, try parsing from tags as fallback
+            if not environment and tags:
+                # Look for a tag that is exactly SIT or UAT
+                env_match = ENV_TAG_RE.search(tags)
+                environment = env_match.group(1).upper() if env_match else ""
+
+                if debug and idx <= 5:
+                    log.debug(f"   Parsing from tags: '{tags}'")
+                    if environment:
+                        log.debug(f"   ✅ Environment from tags: '{environment}'")
+
+            if debug:
+                # Update statistics
+                if environment:
+                    env_upper = environment.upper()
+                    if "SIT" in env_upper and "UAT" in env_upper:
+                        environment_stats["Both"] += 1
+                    elif "SIT" in env_upper:
+                        environment_stats["SIT"] += 1
+                    elif "UAT" in env_upper:
+                        environment_stats["UAT"] += 1
+                    else:
+                        environment_stats["None"] += 1
+                else:
+                    environment_stats["None"] += 1
+
+                if idx <= 5:
+                    log.debug(f"   Final Environment value: '{environment}'")
+
+                # Store sample for debugging
+                if len(environment_stats["samples"]) < 10:
+                    environment_stats["samples"].append({
+                        "id": work_id,
+                        "tags": tags,
+                        "environment": environment
+                    })
+
+            # Extract data
+            assigned_to = fields.get("System.AssignedTo")
+            rows.append((
+                wi_detail.get("id", ""),
+                fields.get("System.WorkItemType", ""),
+                fields.get("System.Title", ""),
+                fields.get("System.State", ""),
+                assigned_to.get("displayName", "") if assigned_to else "",
+                tags,
+                environment,
+                fields.get("Microsoft.VSTS.Common.Severity", ""),
+                issue_link
+            ))
+
+        except Exception as e:
+            print(f"⚠️ Error processing work item {work_id}: {str(e)}")
+            continue
+
+    # 🔍 DEBUG: Print environment extraction summary
+    if debug:
+        log.debug("\n" + "="*80)
+        log.debug("📊 ENVIRONMENT EXTRACTION SUMMARY")
+        log.debug("="*80)
+        log.debug(f"Total work items processed: {len(rows)}")
+        log.debug(f"Items with SIT only: {environment_stats['SIT']}")
+        log.debug(f"Items with UAT only: {environment_stats['UAT']}")
+        log.debug(f"Items with both SIT & UAT: {environment_stats['Both']}")
+        log.debug(f"Items with no environment: {environment_stats['None']}")
+        log.debug("\n📝 Sample entries:")
+        for sample in environment_stats["samples"]:
+            log.debug(f"   ID {sample['id']}: Tags='{sample['tags']}' → Environment='{sample['environment']}'")
+        log.debug("="*80 + "\n")
+
+    # 6️⃣ Save Excel
+    # Written to a .partial file first so a failed save never replaces the last good export
+    partial_path = save_path + ".partial"
+    try:
+        # constant_memory flushes each row to disk as it is written, keeping memory flat for large result sets
+        wb = xlsxwriter.Workbook(partial_path, {"constant_memory": True, "strings_to_urls": False,
+                                                "tmpdir": scratch_dir})
+        sheet = wb.add_worksheet("Defects")
+        sheet.set_column(0, len(headers) - 1, 40)
+        sheet.write_row(0, 0, headers)
+        for row_num, row in enumerate(rows, start=1):
+            sheet.write_row(row_num, 0, row)
+        wb.close()
+    except BaseException:
+        # Don't leave a half-written .partial behind
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    os.replace(partial_path, save_path)
+
+    end_time = time.time()
+    elapsed_time = round(end_time - start_time, 2)
+
+    print(f"✅ Excel file saved at: {save_path}")
+    print(f"⏱️ Total execution time: {elapsed_time} seconds")
+    print(f"📊 Total defects extracted: {len(rows)}")
+
+    # 🔍 Additional debug info
+    if debug:
+        log.debug("\n💡 TIP: Check the Excel file 'Environment' column (Column G) to verify values")
+        log.debug("💡 Expected values: 'SIT', 'UAT', 'SIT, UAT', or empty string")
 
-end_time = time.time()
-elapsed_time = round(end_time - start_time, 2)
+    return 0
 
-print(f"✅ Excel file saved at: {save_path}")
-print(f"⏱️ Total execution time: {elapsed_time} seconds")
-print(f"📊 Total defects extracted: {len(ids)}")
 
-# 🔍 Additional debug info
-print("\n💡 TIP: Check the Excel file 'Environment' column (Column G) to verify values")
-print("💡 Expected values: 'SIT', 'UAT', 'SIT, UAT', or empty string")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(run() or 0)
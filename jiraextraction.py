@@ -1,9 +1,21 @@
 import requests
+try:
+    import orjson as _json  # faster JSON decoding when available
+except ImportError:
+    import json as _json
 from requests.auth import HTTPBasicAuth
-import openpyxl
-from openpyxl.utils import get_column_letter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import xlsxwriter
+import json
 import os
+import sys
+import csv
 import time
+import functools
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 # Jira Configuration
 jira_url = os.getenv("JIRA_URL", "https://techcarrot-team-aqqopo6gxdmd.atlassian.net")
@@ -11,6 +23,26 @@ jira_email = os.getenv("JIRA_EMAIL")
 jira_api_token = os.getenv("JIRA_API_TOKEN")
 jira_project_key = os.getenv("JIRA_PROJECT_KEY", "PROJ")
 jira_label_filter = os.getenv("JIRA_LABEL_FILTER", "")
+# Optional comma-separated status categories to fetch (e.g. "To Do,In Progress" for open bugs only)
+jira_status_categories = [c.strip() for c in os.getenv("JIRA_STATUS_CATEGORY", "").split(",") if c.strip()]
+# Page by startAt on the classic search endpoint, which reports a total and lets pages be fetched concurrently.
+# Jira Server/Data Center only: Atlassian has retired /rest/api/3/search on Jira Cloud (*.atlassian.net)
+use_legacy_search = os.getenv("JIRA_USE_LEGACY_SEARCH", "").lower() in ("1", "true", "yes")
+# "xlsx" (default) or "csv"; CSV skips the workbook writer entirely and is read by the dashboard as well
+export_format = os.getenv("EXPORT_FORMAT", "xlsx").lower()
+# Print per-issue severity diagnostics for the first few rows
+debug = os.getenv("JIRA_DEBUG", "").lower() in ("1", "true", "yes")
+# Request every field (*all) instead of just the ones used; only for inspecting raw issues, it is much slower
+all_fields = os.getenv("JIRA_ALL_FIELDS", "").lower() in ("1", "true", "yes")
+
+# Output file, set up before any API calls so an unwritable data folder fails fast
+current_dir = os.path.dirname(os.path.abspath(__file__))
+data_folder = os.path.join(current_dir, "data")
+os.makedirs(data_folder, exist_ok=True)
+save_path = os.path.join(data_folder, f"Jira {jira_project_key} Defects.{'csv' if export_format == 'csv' else 'xlsx'}")
+# Directory for xlsxwriter's per-sheet scratch files; defaults to the system temp dir. Set e.g.
+# XLSX_SCRATCH_DIR=/dev/shm to keep them in RAM, but only where it has room (Docker's default is 64 MB)
+scratch_dir = os.getenv("XLSX_SCRATCH_DIR") or None
 
 STATE_MAPPING = {
     "Open": "New",
@@ -24,198 +56,377 @@ STATE_MAPPING = {
     "Resolved": "Resolved"
 }
 
-print("🔄 Starting Jira defects extraction...")
-start_time = time.time()
+SEVERITY_MAP = {
+    "Critical": "1 - Critical",
+    "Blocker": "1 - Critical",
+    "Highest": "1 - Critical",
+    "High": "2 - High",
+    "Major": "2 - High",
+    "Medium": "3 - Medium",
+    "Moderate": "3 - Medium",
+    "Low": "4 - Low",
+    "Minor": "4 - Low",
+    "Trivial": "5 - Suggestion",
+    "Lowest": "5 - Suggestion",
+    "Suggestion": "5 - Suggestion",
+    "Cosmetic": "5 - Suggestion"
+}
+# Keyed by lowercase name so raw severities can be matched without any case juggling
+SEVERITY_MAP_LC = {name.lower(): value for name, value in SEVERITY_MAP.items()}
 
-# Build JQL
-if jira_label_filter:
-    if ' ' in jira_project_key:
-        jql_query = f'project = "{jira_project_key}" AND type = Bug AND labels = "{jira_label_filter}" ORDER BY created DESC'
-    else:
-        jql_query = f'project = {jira_project_key} AND type = Bug AND labels = "{jira_label_filter}" ORDER BY created DESC'
-    print(f"🏷️ Using label filter: {jira_label_filter}")
-else:
-    if ' ' in jira_project_key:
-        jql_query = f'project = "{jira_project_key}" AND type = Bug ORDER BY created DESC'
-    else:
-        jql_query = f'project = {jira_project_key} AND type = Bug ORDER BY created DESC'
 
-print(f"📋 Fetching issues from Jira project: {jira_project_key}")
-print(f"🔍 JQL Query: {jql_query}")
+# Only a handful of status/severity combinations occur across all issues, so results are cached
+@functools.lru_cache(maxsize=256)
+def classify(jira_status, severity_value):
+    """Map a Jira status and raw severity to the dashboard (state, severity) pair"""
+    mapped_state = STATE_MAPPING.get(jira_status, jira_status)
+    severity_value = str(severity_value)
+    # Values already in the dashboard's "N - Name" form are kept as they are
+    if severity_value[:1] in "12345" and severity_value[1:4] == " - ":
+        return mapped_state, severity_value
+    severity = SEVERITY_MAP_LC.get(severity_value.lower()) or f"3 - {severity_value}"
+    return mapped_state, severity
+
+
+# Issue fields read when building rows; the detected Severity field is added at runtime
+ISSUE_FIELDS = ["summary", "status", "assignee", "issuetype", "labels", "priority"]
 
 search_url = f"{jira_url}/rest/api/3/search/jql"
+browse_url = f"{jira_url}/browse/"
+legacy_search_url = f"{jira_url}/rest/api/3/search"
 auth = HTTPBasicAuth(jira_email, jira_api_token)
-all_issues = []
-next_page_token = None
-max_results = 100
-
-# Fetch issues
-while True:
-    params = {"jql": jql_query, "maxResults": max_results, "fields": "*all"}
-    if next_page_token:
-        params["nextPageToken"] = next_page_token
-    try:
-        response = requests.get(search_url, params=params, auth=auth, timeout=30)
-        if response.status_code != 200:
-            print(f"❌ Error fetching issues: {response.status_code} - {response.text}")
-            break
-        data = response.json()
-        issues = data.get("issues", [])
-        all_issues.extend(issues)
-        total = data.get("total", len(all_issues))
-        print(f"   Fetched {len(all_issues)}/{total} issues...")
-        next_page_token = data.get("nextPageToken")
-        if data.get("isLast", True) or not next_page_token:
-            break
-    except Exception as e:
-        print(f"⚠️ Error: {str(e)}")
-        break
-
-if not all_issues:
-    print("⚠️ No issues found.")
-    wb = openpyxl.Workbook()
-    sheet = wb.active
-    sheet.title = "Jira Defects"
-    sheet.append(["ID", "Work Item Type", "Title", "State", "Original Jira State", "Assigned To", "Tags", "Severity", "Issue Links"])
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_folder = os.path.join(current_dir, "data")
-    os.makedirs(data_folder, exist_ok=True)
-    save_path = os.path.join(data_folder, f"Jira {jira_project_key} Defects.xlsx")
-    wb.save(save_path)
-    print(f"✅ Empty Excel file created at: {save_path}")
-    exit()
-
-print(f"✅ Found {len(all_issues)} issues. Processing...")
-
-# 🔍 Step 1: Detect 'Severity' field ID from Jira metadata
-severity_field_key = None
-fields_url = f"{jira_url}/rest/api/3/field"
-print("\n🔍 Checking Jira fields metadata for 'Severity' field...")
-try:
-    fields_resp = requests.get(fields_url, auth=auth)
-    if fields_resp.status_code == 200:
-        for f in fields_resp.json():
-            if "severity" in f["name"].lower():
-                severity_field_key = f["id"]
-                print(f"✅ Found Severity field: {f['name']} → {f['id']}")
-                break
-    else:
-        print(f"⚠️ Failed to fetch Jira fields metadata: {fields_resp.status_code}")
-except Exception as e:
-    print(f"⚠️ Error checking fields metadata: {str(e)}")
 
-if not severity_field_key:
-    print("⚠️ Could not detect Severity field in metadata, will check issue fields directly.")
 
-# Create Excel
-wb = openpyxl.Workbook()
-sheet = wb.active
-sheet.title = "Jira Defects"
-sheet.append(["ID", "Work Item Type", "Title", "State", "Original Jira State", "Assigned To", "Tags", "Severity", "Issue Links"])
+def field_value(obj):
+    """Return the display value of a Jira option/object field, a plain string as is, else None"""
+    if isinstance(obj, dict):
+        return obj.get("value") or obj.get("name")
+    return obj if isinstance(obj, str) else None
 
-# Process issues
-for idx, issue in enumerate(all_issues, start=2):
+
+def extract(issue, severity_field_key):
+    """Build the sheet row for one Jira issue (no I/O; only reads module-level constants like browse_url)"""
     fields = issue.get("fields", {})
     issue_key = issue.get("key", "")
 
-    issue_type_obj = fields.get("issuetype")
-    issue_type = issue_type_obj.get("name", "Bug") if isinstance(issue_type_obj, dict) else "Bug"
+    # Jira returns these fields as objects or null, never as bare values, but a name inside
+    # can itself be null (e.g. deleted or anonymised users), so defaults are applied with `or`.
+    # The few distinct type/status/assignee names repeat on every row, so they are interned
+    issue_type = sys.intern((fields.get("issuetype") or {}).get("name") or "Bug")
 
     title = fields.get("summary") or issue_key
     if isinstance(title, dict):
         title = title.get("content", "") or str(title)
 
-    status_obj = fields.get("status")
-    jira_status = status_obj.get("name", "Unknown") if isinstance(status_obj, dict) else "Unknown"
-    mapped_state = STATE_MAPPING.get(jira_status, jira_status)
+    jira_status = sys.intern((fields.get("status") or {}).get("name") or "Unknown")
 
-    assignee_obj = fields.get("assignee")
-    if isinstance(assignee_obj, dict):
-        assignee_name = (
-            assignee_obj.get("displayName") or
-            assignee_obj.get("emailAddress", "").split("@")[0] or
-            "Unassigned"
-        )
-    else:
-        assignee_name = "Unassigned"
-
-    # === Severity Extraction ===
-    severity_value = None
-
-    # Attempt 1: use detected Severity field ID from metadata
-    if severity_field_key:
-        severity_obj = fields.get(severity_field_key)
-        if isinstance(severity_obj, dict):
-            severity_value = severity_obj.get("value") or severity_obj.get("name")
-        elif isinstance(severity_obj, str):
-            severity_value = severity_obj
-
-    # Attempt 2: common Severity field names
-    if not severity_value:
-        for field_name in ["Severity", "severity", "SEVERITY"]:
-            val = fields.get(field_name)
-            if val:
-                if isinstance(val, dict):
-                    severity_value = val.get("value") or val.get("name")
-                elif isinstance(val, str):
-                    severity_value = val
-                break
-
-    # Attempt 3: Fallback to Priority (only if absolutely needed)
-    if not severity_value:
-        priority_obj = fields.get("priority")
-        if isinstance(priority_obj, dict):
-            severity_value = priority_obj.get("name", "Medium")
-            if idx <= 3:
-                print(f"   ℹ️ Issue {issue_key}: Using Priority '{severity_value}' as Severity fallback")
-        else:
-            severity_value = "Medium"
-
-    # Normalize severity
-    severity_map = {
-        "Critical": "1 - Critical",
-        "Blocker": "1 - Critical",
-        "Highest": "1 - Critical",
-        "High": "2 - High",
-        "Major": "2 - High",
-        "Medium": "3 - Medium",
-        "Moderate": "3 - Medium",
-        "Low": "4 - Low",
-        "Minor": "4 - Low",
-        "Trivial": "5 - Suggestion",
-        "Lowest": "5 - Suggestion",
-        "Suggestion": "5 - Suggestion",
-        "Cosmetic": "5 - Suggestion"
-    }
-    severity = severity_map.get(str(severity_value).capitalize(), f"3 - {severity_value}")
+    assignee_obj = fields.get("assignee") or {}
+    assignee_name = sys.intern(
+        assignee_obj.get("displayName") or
+        (assignee_obj.get("emailAddress") or "").split("@")[0] or
+        "Unassigned"
+    )
 
-    if idx <= 6:
-        print(f"   Issue {issue_key}: Severity = '{severity_value}' → '{severity}'")
+    # Severity from the detected field, falling back to Priority
+    severity_value = (field_value(fields.get(severity_field_key)) or
+                      field_value(fields.get("priority")) or "Medium")
 
-    # Tags
-    labels = fields.get("labels", [])
-    tags = ", ".join(labels) if isinstance(labels, list) else ""
+    # Map state and normalize severity
+    mapped_state, severity = classify(jira_status, severity_value)
 
-    issue_url = f"{jira_url}/browse/{issue_key}"
+    # Tags
+    tags = ", ".join(fields.get("labels") or ())
 
-    sheet.append([
+    return [
         issue_key, issue_type, str(title),
         mapped_state, jira_status, assignee_name,
-        tags, severity, issue_url
-    ])
+        tags, severity, browse_url + issue_key
+    ]
 
-# Adjust widths
-for col in range(1, 10):
-    sheet.column_dimensions[get_column_letter(col)].width = 40
 
-# Save
-current_dir = os.path.dirname(os.path.abspath(__file__))
-data_folder = os.path.join(current_dir, "data")
-os.makedirs(data_folder, exist_ok=True)
-save_path = os.path.join(data_folder, f"Jira {jira_project_key} Defects.xlsx")
-wb.save(save_path)
+# One pooled session for all Jira calls: keep-alive reuses the TLS connection between pages,
+# and transient errors (429/5xx) are retried with backoff before the status is reported.
+# Searches are read-only POSTs, so POST is retried too, honouring Jira's Retry-After on 429
+session = requests.Session()
+session.auth = auth
+session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=None, respect_retry_after_header=True, raise_on_status=False)
+))
+max_results = 1000  # Jira may serve fewer per page; the first page is checked for that
+max_workers = 5
+fields_cache_ttl = 24 * 60 * 60  # seconds a cached Severity field lookup stays valid
+
+
+class JiraSearchError(Exception):
+    """A search page could not be fetched, so the export would be incomplete"""
+
+
+def jql_string(value):
+    """Quote a value as a JQL string literal, escaping backslashes and double quotes"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_jql(project_key, label_filter, status_categories=()):
+    """Build the bug search JQL; Jira accepts quoted project keys, so the key is always quoted"""
+    parts = [f"project = {jql_string(project_key)}", "type = Bug"]
+    if label_filter:
+        parts.append(f"labels = {jql_string(label_filter)}")
+    if status_categories:
+        parts.append(f"statusCategory in ({', '.join(jql_string(c) for c in status_categories)})")
+    return " AND ".join(parts) + " ORDER BY created DESC"
+
+
+def fetch_page_at(jql_query, search_fields, start_at, page_size):
+    """Fetch one page of issues by offset from the classic search endpoint"""
+    payload = {"jql": jql_query, "startAt": start_at, "maxResults": page_size, "fields": search_fields}
+    page_response = session.post(legacy_search_url, json=payload, timeout=30)
+    page_response.raise_for_status()
+    return _json.loads(page_response.content).get("issues", [])
+
+
+def fetch_search_page(jql_query, search_fields, start_at, next_page_token):
+    """Fetch one search page; returns the decoded response, or None after reporting the error"""
+    # POST keeps long JQL and field lists out of the URL, which Jira limits in length
+    payload = {"jql": jql_query, "maxResults": max_results, "fields": search_fields}
+    if use_legacy_search:
+        payload["startAt"] = start_at
+    elif next_page_token:
+        payload["nextPageToken"] = next_page_token
+    try:
+        response = session.post(legacy_search_url if use_legacy_search else search_url,
+                                json=payload, timeout=30)
+        if response.status_code != 200:
+            print(f"❌ Error fetching issues: {response.status_code} - {response.text}")
+            return None
+        return _json.loads(response.content)
+    except Exception as e:
+        print(f"⚠️ Error: {str(e)}")
+        return None
+
+
+def iter_pages_at(jql_query, search_fields, offsets, page_size):
+    """Fetch offset pages concurrently but yield them in order, with at most max_workers pages in flight"""
+    offsets = iter(offsets)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque(executor.submit(fetch_page_at, jql_query, search_fields, start_at, page_size)
+                       for start_at in islice(offsets, max_workers))
+        try:
+            while window:
+                page_issues = window.popleft().result()
+                start_at = next(offsets, None)
+                if start_at is not None:
+                    window.append(executor.submit(fetch_page_at, jql_query, search_fields, start_at, page_size))
+                yield page_issues
+        finally:
+            for future in window:
+                future.cancel()
+
+
+def iter_issues(jql_query, search_fields):
+    """Yield issues page by page as they arrive, so only a few pages are held in memory at a time"""
+    fetched = 0
+    # The next page is requested before the current one is yielded, so its download overlaps
+    # with writing the current rows (still only one request in flight)
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        pending = prefetcher.submit(fetch_search_page, jql_query, search_fields, 0, None)
+        while pending:
+            data = pending.result()
+            pending = None
+            if data is None:
+                raise JiraSearchError(f"Jira search failed after {fetched} issues")
+
+            issues = data.get("issues", [])
+            fetched += len(issues)
+            total = data.get("total", fetched)
+            print(f"   Fetched {fetched}/{total} issues...")
+            next_page_token = data.get("nextPageToken")
+            if use_legacy_search:
+                is_last = not issues or fetched >= total
+            else:
+                is_last = data.get("isLast", True) or not next_page_token
+
+            # Jira Cloud routinely serves fewer than requested, so this is only a debug note, and
+            # only when more pages remain (a short last or only page is expected)
+            if debug and fetched == len(issues) and not is_last and len(issues) < max_results:
+                print(f"   ℹ️ Jira capped the page size at {len(issues)} issues (requested {max_results})")
+
+            # The classic endpoint reports a total, so the remaining pages are fetched concurrently
+            # by offset; /search/jql keeps following nextPageToken one page at a time
+            fan_out = use_legacy_search and issues and fetched == len(issues) and total > len(issues)
+            if not is_last and not fan_out:
+                pending = prefetcher.submit(fetch_search_page, jql_query, search_fields, fetched, next_page_token)
+            yield from issues
+
+            if fan_out:
+                page_size = len(issues)
+                offsets = range(page_size, total, page_size)
+                print(f"   Fetching {len(offsets)} remaining pages concurrently...")
+                try:
+                    for page_issues in iter_pages_at(jql_query, search_fields, offsets, page_size):
+                        fetched += len(page_issues)
+                        print(f"   Fetched {fetched}/{total} issues...")
+                        yield from page_issues
+                except Exception as e:
+                    # Pages up to `fetched` were already yielded in order, so carry on from there
+                    print(f"⚠️ Concurrent fetch failed, continuing page by page from {fetched}: {str(e)}")
+                    pending = prefetcher.submit(fetch_search_page, jql_query, search_fields, fetched, None)
+                else:
+                    return
+
+
+def load_fields_cache(cache_path):
+    """Load cached field lookups keyed by Jira site, or {} when there is no usable cache"""
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    # Drop hand-edited or malformed entries; they are treated as cache misses
+    return {
+        site: entry for site, entry in cache.items()
+        if isinstance(entry, dict)
+        and isinstance(entry.get("fetched_at"), (int, float))
+        and isinstance(entry.get("severity_field"), (str, type(None)))
+    }
+
+
+def save_fields_cache(cache_path, cache):
+    """Write the field cache atomically (temp file + os.replace) so a reader never sees a partial file"""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not write fields cache: {str(e)}")
+
+
+def run():
+    """Extract Jira bugs for the configured project into data/Jira <project> Defects.xlsx"""
+    print("🔄 Starting Jira defects extraction...")
+    start_time = time.time()
+
+    jql_query = build_jql(jira_project_key, jira_label_filter, jira_status_categories)
+    if jira_label_filter:
+        print(f"🏷️ Using label filter: {jira_label_filter}")
+    if jira_status_categories:
+        print(f"🗂️ Using status category filter: {', '.join(jira_status_categories)}")
+
+    print(f"📋 Fetching issues from Jira project: {jira_project_key}")
+    print(f"🔍 JQL Query: {jql_query}")
+
+    # 🔍 Detect 'Severity' field ID from Jira metadata, so it can be requested with the issues.
+    # The field schema is site-wide and rarely changes, so the result is cached for a day
+    severity_field_key = None
+    fields_cache_path = os.path.join(data_folder, ".jira_fields_cache.json")
+    fields_cache = load_fields_cache(fields_cache_path)
+    cached = fields_cache.get(jira_url) or {}
+    if time.time() - cached.get("fetched_at", 0) < fields_cache_ttl:
+        severity_field_key = cached.get("severity_field")
+        print(f"\n✅ Using cached Severity field: {severity_field_key or 'none'}")
+    else:
+        fields_url = f"{jira_url}/rest/api/3/field"
+        print("\n🔍 Checking Jira fields metadata for 'Severity' field...")
+        try:
+            fields_resp = session.get(fields_url, timeout=30)
+            if fields_resp.status_code == 200:
+                for f in _json.loads(fields_resp.content):
+                    if "severity" in f["name"].lower():
+                        severity_field_key = f["id"]
+                        print(f"✅ Found Severity field: {f['name']} → {f['id']}")
+                        break
+                fields_cache[jira_url] = {"severity_field": severity_field_key, "fetched_at": time.time()}
+                save_fields_cache(fields_cache_path, fields_cache)
+            else:
+                print(f"⚠️ Failed to fetch Jira fields metadata: {fields_resp.status_code}")
+        except Exception as e:
+            print(f"⚠️ Error checking fields metadata: {str(e)}")
+
+    if not severity_field_key:
+        print("⚠️ Could not detect Severity field in metadata, will fall back to Priority.")
+
+    # Only request the fields used below (plus the Severity field when detected) instead of *all
+    if all_fields:
+        search_fields = ["*all"]
+        print("⚠️ JIRA_ALL_FIELDS is set, requesting every issue field")
+    else:
+        search_fields = ISSUE_FIELDS + ([severity_field_key] if severity_field_key else [])
+
+    headers = ["ID", "Work Item Type", "Title", "State", "Original Jira State", "Assigned To", "Tags", "Severity", "Issue Links"]
+    column_widths = [12, 12, 60, 12, 16, 24, 40, 16, 60]
+
+    # Rows go to a .partial file that only replaces the previous export once every page is fetched
+    partial_path = save_path + ".partial"
+    if export_format == "csv":
+        # Stream rows straight to a CSV file
+        out_file = open(partial_path, "w", newline="", encoding="utf-8")
+        csv_writer = csv.writer(out_file, lineterminator="\n")
+        csv_writer.writerow(headers)
+
+        def write_row(row_num, row):
+            csv_writer.writerow(row)
+    else:
+        # Create Excel (constant_memory: each row is flushed to disk as soon as it is written)
+        out_file = xlsxwriter.Workbook(partial_path, {"constant_memory": True, "strings_to_urls": False,
+                                                       "tmpdir": scratch_dir})
+        sheet = out_file.add_worksheet("Jira Defects")
+        # Widths are set before any rows, as constant_memory requires
+        for col, width in enumerate(column_widths):
+            sheet.set_column(col, col, width)
+        sheet.write_row(0, 0, headers)
+
+        def write_row(row_num, row):
+            sheet.write_row(row_num, 0, row)
+
+    # Fetch issues and write each page's rows as soon as it arrives
+    issue_count = 0
+    # Local binding keeps the per-row global lookup out of the hot loop
+    _extract = extract
+    try:
+        for row_num, issue in enumerate(iter_issues(jql_query, search_fields), start=1):
+            issue_count += 1
+            row = _extract(issue, severity_field_key)
+            write_row(row_num, row)
+
+            if debug and row_num <= 5:
+                if row_num <= 2 and not field_value(issue.get("fields", {}).get(severity_field_key)):
+                    print(f"   ℹ️ Issue {row[0]}: Using Priority as Severity fallback")
+                print(f"   Issue {row[0]}: Severity → '{row[7]}'")
+
+        # Save
+        out_file.close()
+    except BaseException as e:
+        # Whatever went wrong, don't leave a partial file behind or replace the last good export
+        try:
+            out_file.close()
+        except Exception:
+            pass
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        if isinstance(e, JiraSearchError):
+            print(f"❌ {str(e)}; {save_path} was not updated")
+            return 1
+        raise
+
+    os.replace(partial_path, save_path)
+
+    if not issue_count:
+        print("⚠️ No issues found.")
+        print(f"✅ Empty {export_format.upper()} file created at: {save_path}")
+        return 0
+
+    elapsed_time = round(time.time() - start_time, 2)
+    print(f"\n✅ {export_format.upper()} file saved at: {save_path}")
+    print(f"⏱️ Total execution time: {elapsed_time} seconds")
+    print(f"📊 Total defects extracted: {issue_count}")
+
+    return 0
+
 
-elapsed_time = round(time.time() - start_time, 2)
-print(f"\n✅ Excel file saved at: {save_path}")
-print(f"⏱️ Total execution time: {elapsed_time} seconds")
-print(f"📊 Total defects extracted: {len(all_issues)}")
+if __name__ == "__main__":
+    sys.exit(run() or 0)